@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import hashlib
+import requests
+
+# 凭证检测结果缓存："有效期至"标记，有效期内重复运行可跳过检测请求
+AUTH_CACHE_FILE = os.getenv("AUTH_CACHE_FILE", ".auth_cache.json")
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "600"))
+
+WEREAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Referer": "https://weread.qq.com/"
+}
+
+def fingerprint(kind, *credentials):
+    """凭证指纹，缓存中只保存哈希，不保存凭证本身"""
+    raw = "\n".join(str(c) for c in credentials)
+    return f"{kind}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+def load_auth_cache(path=AUTH_CACHE_FILE):
+    """读取凭证缓存，文件损坏时视为空"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_known_good(key, path=AUTH_CACHE_FILE):
+    """凭证是否仍在“有效期至”标记之内"""
+    return load_auth_cache(path).get(key, 0) > time.time()
+
+def mark_known_good(key, ttl=AUTH_CACHE_TTL, path=AUTH_CACHE_FILE):
+    """记录凭证有效，有效期为 ttl 秒"""
+    now = time.time()
+    cache = {k: v for k, v in load_auth_cache(path).items() if v > now}
+    cache[key] = now + ttl
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+def probe_weread(cookie, timeout=15):
+    """检测微信读书Cookie，有效时返回完整的笔记本列表数据，否则返回None"""
+    headers = dict(WEREAD_HEADERS, Cookie=cookie)
+    try:
+        response = requests.get(
+            "https://i.weread.qq.com/user/notebooks",
+            headers=headers,
+            timeout=timeout
+        )
+        if response.status_code != 200:
+            print(f"❌ 微信读书API请求失败: HTTP {response.status_code}")
+            print(f"响应内容: {response.text[:200]}...")
+            return None
+
+        data = response.json()
+        if "books" not in data:
+            print("❌ 返回数据中未找到'books'字段")
+            print(f"响应内容: {response.text[:200]}")
+            return None
+        return data
+
+    except Exception as e:
+        print(f"❌ 微信读书Cookie检测失败: {str(e)}")
+        return None
+
+def probe_notion(notion_client, database_id):
+    """检测Notion令牌与数据库访问权限
+
+    databases.retrieve 同时验证了令牌和数据库连接，无需再单独调用 users.me。
+    """
+    try:
+        db_info = notion_client.databases.retrieve(database_id=database_id)
+        title = db_info["title"][0]["text"]["content"] if db_info.get("title") else "未命名"
+        print(f"  ✅ 数据库访问成功! 名称: {title}")
+        return True
+    except Exception as e:
+        print(f"❌ Notion检测失败: {str(e)}")
+        print("可能原因:")
+        print("1. NOTION_TOKEN 无效")
+        print("2. 数据库未连接集成")
+        print("3. 数据库ID错误")
+        return False
+
+def bootstrap(cookie, notion_client=None, database_id=None, notion_token=None, force=False):
+    """一次性检测两端凭证，返回 (是否有效, 笔记本列表数据)
+
+    笔记本列表数据在检测微信读书时已下载，直接交给同步流程复用；
+    凭证在有效期内时跳过检测，此时数据为None，需由调用方自行获取。
+    """
+    notebooks = None
+    weread_key = fingerprint("weread", cookie)
+    if force or not is_known_good(weread_key):
+        print("  检测微信读书Cookie...")
+        notebooks = probe_weread(cookie)
+        if notebooks is None:
+            return False, None
+        mark_known_good(weread_key)
+        print(f"  ✅ 微信读书Cookie有效! 书架书籍数: {len(notebooks['books'])}")
+    else:
+        print("  ⏭️ 微信读书Cookie在有效期内，跳过检测")
+
+    if notion_client is not None:
+        notion_key = fingerprint("notion", notion_token, database_id)
+        if force or not is_known_good(notion_key):
+            print("  检测Notion数据库访问...")
+            if not probe_notion(notion_client, database_id):
+                return False, notebooks
+            mark_known_good(notion_key)
+        else:
+            print("  ⏭️ Notion凭证在有效期内，跳过检测")
+
+    return True, notebooks
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+from datetime import datetime
+
+# 写入Notion失败的请求持久化到死信队列，下次运行时优先重试
+DEAD_LETTER_FILE = os.getenv("DEAD_LETTER_FILE", "dead_letter.json")
+
+# 重试次数达到上限的请求（如参数校验失败）不再自动重试，保留在队列中待人工排查
+MAX_ATTEMPTS = int(os.getenv("DEAD_LETTER_MAX_ATTEMPTS", "5"))
+
+def load_dead_letters(path=DEAD_LETTER_FILE):
+    """读取死信队列，不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_dead_letters(entries, path=DEAD_LETTER_FILE):
+    """写入死信队列，队列为空时删除文件"""
+    if not entries:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def merge_dead_letters(paths, target=DEAD_LETTER_FILE):
+    """把分片死信队列并入目标队列，并删除已合并的分片文件，返回合并后的队列"""
+    entries = load_dead_letters(target)
+    merged = [path for path in paths if os.path.abspath(path) != os.path.abspath(target)]
+    for path in merged:
+        shard = load_dead_letters(path)
+        entries.extend(shard)
+        print(f"已合并死信队列: {path} ({len(shard)} 条)")
+    save_dead_letters(entries, target)
+    for path in merged:
+        os.remove(path)
+    return entries
+
+def queued_keys(entries):
+    """队列中全部请求对应的 (bookId, note_key) 集合"""
+    return {(entry.get("meta", {}).get("bookId"), entry.get("meta", {}).get("key")) for entry in entries}
+
+def pending_dead_letters(entries):
+    """尚未搁置、仍会自动重试的请求"""
+    return [entry for entry in entries if not entry.get("parked")]
+
+def push_dead_letter(entries, payload, error, meta=None):
+    """将已构建好的 pages.create 参数加入内存中的死信队列，由调用方统一保存"""
+    entries.append({
+        "payload": payload,
+        "error": str(error),
+        "failedAt": datetime.now().isoformat(timespec="seconds"),
+        "attempts": 1,
+        "meta": meta or {},
+    })
+    print(f"  📥 已加入死信队列，下次运行时重试 (队列长度: {len(entries)})")
+
+def retry_dead_letters(notion_client, entries, on_success=None, on_park=None, deadline=None, margin=2, interval=0.3):
+    """重试死信队列中的写入，返回 (成功数, 剩余队列)
+
+    on_success(entry, page) 在每条重试成功后调用，可用于更新本地状态；
+    on_park(entry) 在请求被搁置时调用，可用于释放状态中的待重试记录。
+    距截止时间（time.monotonic() 时间戳）不足 margin 秒时停止，未重试的请求留在队列中；
+    失败次数达到 MAX_ATTEMPTS 的请求被搁置，不再自动重试。
+    """
+    pending = pending_dead_letters(entries)
+    if not pending:
+        return 0, entries
+
+    print(f"🔁 重试死信队列中的 {len(pending)} 条写入...")
+    remaining = []
+    success = 0
+    for entry in entries:
+        if entry.get("parked") or (deadline is not None and deadline - time.monotonic() < margin):
+            remaining.append(entry)
+            continue
+        try:
+            page = notion_client.pages.create(**entry["payload"])
+            success += 1
+            if on_success:
+                on_success(entry, page)
+        except Exception as e:
+            entry["attempts"] = entry.get("attempts", 1) + 1
+            entry["error"] = str(e)
+            if entry["attempts"] >= MAX_ATTEMPTS:
+                entry["parked"] = True
+                print(f"  ⛔ 已失败 {entry['attempts']} 次，搁置不再重试: {str(e)}")
+                if on_park:
+                    on_park(entry)
+            else:
+                print(f"  ❌ 重试失败: {str(e)}")
+            remaining.append(entry)
+        time.sleep(interval)
+
+    parked = len(remaining) - len(pending_dead_letters(remaining))
+    print(f"  ✅ 重试成功 {success} 条, 剩余 {len(remaining)} 条（其中搁置 {parked} 条）")
+    return success, remaining
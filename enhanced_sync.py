@@ -5,6 +5,8 @@ import time
 from datetime import datetime
 from notion_client import Client
 from urllib.parse import unquote
+import weread_stream
+import reading_progress
 
 # 环境变量配置
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -28,7 +30,7 @@ def get_weread_userid(cookie_dict):
     return cookie_dict.get('wr_vid', 'unknown')
 
 def get_book_list(user_id):
-    """获取书架图书列表"""
+    """获取书架图书列表，同时从同一响应中提取每本书的阅读进度"""
     url = f"https://i.weread.qq.com/shelf/sync?userVid={user_id}&synckey=0&lectureSynckey=0"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -38,14 +40,15 @@ def get_book_list(user_id):
     try:
         response = requests.get(url, headers=headers, timeout=10)
         if response.status_code == 200:
-            return response.json().get("books", [])
+            data = response.json()
+            return data.get("books", []), reading_progress.extract_progress(data)
         print(f"获取书架失败: HTTP {response.status_code}")
     except Exception as e:
         print(f"获取书架异常: {str(e)}")
-    return []
+    return [], {}
 
 def get_book_notes(book_id, user_id):
-    """获取图书笔记"""
+    """流式获取图书笔记，边下载边解析，逐条产出"""
     url = f"https://i.weread.qq.com/book/bookmarklist?bookId={book_id}&userVid={user_id}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -53,13 +56,13 @@ def get_book_notes(book_id, user_id):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            return response.json().get("updated", [])
-        print(f"获取笔记失败: HTTP {response.status_code}")
+        with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code == 200:
+                yield from weread_stream.iter_bookmarks(response)
+                return
+            print(f"获取笔记失败: HTTP {response.status_code}")
     except Exception as e:
         print(f"获取笔记异常: {str(e)}")
-    return []
 
 def sync_to_notion(book_info, notes):
     """同步笔记到Notion"""
@@ -109,23 +112,24 @@ if __name__ == "__main__":
     print(f"用户ID: {user_id}")
     
     # 获取书架图书
-    books = get_book_list(user_id)
+    books, progress = get_book_list(user_id)
     if not books:
         print("❌ 未获取到书籍信息")
         exit(1)
         
     print(f"获取到 {len(books)} 本书籍")
     
+    # 阅读进度直接取自书架响应，数值变化时才写入
+    reading_progress.sync_progress(notion, books, progress)
+    
     # 处理每本书的笔记
     total_notes = 0
     for book in books:
         book_id = book["bookId"]
+        print(f"处理书籍《{book['title']}》")
         notes = get_book_notes(book_id, user_id)
-        if not notes:
-            continue
-            
-        print(f"处理书籍《{book['title']}》: {len(notes)} 条笔记")
         synced = sync_to_notion(book, notes)
+        print(f"  同步 {synced} 条笔记")
         total_notes += synced
         time.sleep(1)  # 避免请求过快
     
@@ -7,6 +7,8 @@ import string
 from datetime import datetime
 from notion_client import Client
 from urllib.parse import unquote
+import weread_stream
+import reading_progress
 
 # 环境变量配置
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -35,7 +37,7 @@ def get_weread_userid(cookie_dict):
     return cookie_dict.get('wr_vid', 'unknown')
 
 def get_book_list(user_id, device_id):
-    """获取书架图书列表"""
+    """获取书架图书列表，同时从同一响应中提取每本书的阅读进度"""
     url = f"https://i.weread.qq.com/shelf/sync?userVid={user_id}&synckey=0&lectureSynckey=0"
     
     headers = {
@@ -59,7 +61,7 @@ def get_book_list(user_id, device_id):
         
         if response.status_code == 200:
             data = response.json()
-            return data.get("books", [])
+            return data.get("books", []), reading_progress.extract_progress(data)
         
         # 打印详细错误信息
         print(f"错误响应内容: {response.text[:200]}")
@@ -69,10 +71,10 @@ def get_book_list(user_id, device_id):
     except Exception as e:
         print(f"获取书架异常: {str(e)}")
     
-    return []
+    return [], {}
 
 def get_book_notes(book_id, user_id, device_id):
-    """获取图书笔记"""
+    """流式获取图书笔记，边下载边解析，逐条产出"""
     url = f"https://i.weread.qq.com/book/bookmarklist?bookId={book_id}&userVid={user_id}"
     
     headers = {
@@ -84,17 +86,16 @@ def get_book_notes(book_id, user_id, device_id):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=15)
-        if response.status_code == 200:
-            return response.json().get("updated", [])
-        
-        print(f"获取笔记失败: HTTP {response.status_code}")
-        print(f"URL: {url}")
+        with requests.get(url, headers=headers, timeout=15, stream=True) as response:
+            if response.status_code == 200:
+                yield from weread_stream.iter_bookmarks(response)
+                return
+            
+            print(f"获取笔记失败: HTTP {response.status_code}")
+            print(f"URL: {url}")
         
     except Exception as e:
         print(f"获取笔记异常: {str(e)}")
-    
-    return []
 
 def sync_to_notion(book_info, notes):
     """同步笔记到Notion"""
@@ -149,7 +150,7 @@ if __name__ == "__main__":
     
     # 获取书架图书
     print("获取书架图书中...")
-    books = get_book_list(user_id, device_id)
+    books, progress = get_book_list(user_id, device_id)
     
     if not books:
         print("❌ 未获取到书籍信息，请检查日志")
@@ -157,18 +158,17 @@ if __name__ == "__main__":
         
     print(f"获取到 {len(books)} 本书籍")
     
+    # 阅读进度直接取自书架响应，数值变化时才写入
+    reading_progress.sync_progress(notion, books, progress)
+    
     # 处理每本书的笔记
     total_notes = 0
     for book in books:
         book_id = book["bookId"]
         print(f"处理书籍: 《{book['title']}》")
         notes = get_book_notes(book_id, user_id, device_id)
-        if not notes:
-            print("  未找到笔记")
-            continue
-            
-        print(f"  找到 {len(notes)} 条笔记")
         synced = sync_to_notion(book, notes)
+        print(f"  同步 {synced} 条笔记")
         total_notes += synced
         time.sleep(1)  # 避免请求过快
     
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+# 合并同一章节中重叠或相邻的划线，减少Notion写入次数
+
+def parse_range(value):
+    """解析划线位置 "start-end"，无法解析时返回None"""
+    try:
+        start, end = (int(part) for part in str(value).split("-", 1))
+    except ValueError:
+        return None
+    return (start, end) if end >= start else None
+
+def _anchor(note):
+    """合并笔记的锚点：最早创建的划线，后续新增划线不会改变它"""
+    return (note.get("createTime", 0), note.get("bookmarkId", ""))
+
+def merged_key(bookmark_id):
+    """合并笔记的ID，以锚点划线的 bookmarkId 为准，区别于该划线单独同步时的ID"""
+    return f"merged_{bookmark_id}"
+
+def _extend(merged, note, span):
+    """把与当前区间重叠或相邻的划线并入 merged"""
+    start, end = merged["span"]
+    new_start, new_end = span
+    # 区间按 [start, end) 处理，new_start == end 即首尾相接
+    if new_end > end:
+        text = note.get("markText", "")
+        # 只拼接超出当前区间的部分
+        overlap = max(0, min(end - new_start, len(text)))
+        merged["markText"] += text[overlap:]
+        merged["span"] = (start, new_end)
+    merged["createTime"] = max(merged.get("createTime", 0), note.get("createTime", 0))
+    merged["mergedFrom"].append(note.get("bookmarkId", ""))
+    merged["anchor"] = min(merged["anchor"], _anchor(note))
+
+def merge_highlights(notes, synced=()):
+    """按章节建立区间索引，合并重叠或相邻的划线
+
+    带想法的笔记、缺少位置信息的划线，以及 synced 中已单独同步过的划线原样保留，
+    避免开启合并后与已有页面重复。合并后的笔记以最早创建的划线生成固定ID，
+    新增划线只改变其内容，按内容变化走更新流程，不会产生新的合并笔记。
+    """
+    passthrough = []
+    chapters = defaultdict(list)
+    for note in notes:
+        span = parse_range(note.get("range"))
+        if note.get("abstract") or span is None or note.get("bookmarkId") in synced:
+            passthrough.append(note)
+        else:
+            chapters[note.get("chapterUid")].append((span, note))
+
+    merged_notes = []
+    for chapter_uid, spans in chapters.items():
+        spans.sort(key=lambda item: item[0])
+        current = None
+        for span, note in spans:
+            if current is not None and span[0] <= current["span"][1]:
+                _extend(current, note, span)
+                continue
+            if current is not None:
+                merged_notes.append(current)
+            current = dict(note, span=span, mergedFrom=[note.get("bookmarkId", "")], anchor=_anchor(note))
+        if current is not None:
+            merged_notes.append(current)
+
+    for note in merged_notes:
+        start, end = note.pop("span")
+        note["range"] = f"{start}-{end}"
+        anchor = note.pop("anchor")
+        if len(note["mergedFrom"]) > 1:
+            note["bookmarkId"] = merged_key(anchor[1])
+
+    merged_notes.sort(key=lambda n: (n.get("chapterUid") or 0, parse_range(n["range"])))
+    return passthrough + merged_notes
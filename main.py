@@ -5,6 +5,9 @@ from datetime import datetime
 import sys
 import json
 import time
+import itertools
+import bootstrap
+import weread_stream
 
 print("=" * 80)
 print("🚀 微信读书到Notion同步脚本启动")
@@ -31,31 +34,20 @@ print(f"🔑 NOTION_TOKEN: {NOTION_TOKEN[:5]}...{NOTION_TOKEN[-5:]}")
 print(f"📁 DATABASE_ID: {DATABASE_ID}")
 print(f"🍪 WR_COOKIE: {WR_COOKIE[:15]}... (长度: {len(WR_COOKIE)})")
 
-# 初始化Notion客户端
+# 初始化Notion客户端并检测凭证
 print("\n🔌 初始化Notion客户端...")
-try:
-    notion = Client(auth=NOTION_TOKEN, log_level="DEBUG")
-    
-    # 测试连接
-    print("  测试Notion连接...")
-    me = notion.users.me()
-    print(f"  ✅ Notion连接成功! 用户: {me['name']} ({me['id']})")
-    
-    # 测试数据库访问
-    print("  测试数据库访问...")
-    db_info = notion.databases.retrieve(database_id=DATABASE_ID)
-    print(f"  ✅ 数据库访问成功! 名称: {db_info['title'][0]['text']['content']}")
-    
-except Exception as e:
-    print(f"❌ Notion客户端初始化失败: {str(e)}")
-    print("可能原因:")
-    print("1. NOTION_TOKEN 无效")
-    print("2. 数据库未连接集成")
-    print("3. 数据库ID错误")
+notion = Client(auth=NOTION_TOKEN, log_level="DEBUG")
+auth_ok, notebooks = bootstrap.bootstrap(WR_COOKIE, notion, DATABASE_ID, notion_token=NOTION_TOKEN)
+if not auth_ok:
+    print("❌ 凭证检测失败，同步终止")
     sys.exit(1)
 
-def fetch_weread_notes():
-    """获取微信读书笔记"""
+def fetch_weread_notes(notebooks=None):
+    """获取微信读书笔记，已有检测阶段下载的笔记本列表时直接复用"""
+    if notebooks is not None:
+        print(f"\n📚 复用检测阶段获取的笔记本列表: {len(notebooks['books'])} 本书")
+        return notebooks["books"]
+    
     print("\n📚 从微信读书获取笔记数据...")
     headers = {
         "Cookie": WR_COOKIE,
@@ -91,7 +83,7 @@ def fetch_weread_notes():
         return []
 
 def process_book_notes(book):
-    """处理单本书的笔记"""
+    """处理单本书的笔记：流式解析响应，逐条产出处理后的笔记"""
     book_id = book["bookId"]
     book_title = book["title"]
     headers = {"Cookie": WR_COOKIE}
@@ -101,48 +93,41 @@ def process_book_notes(book):
         res = requests.get(
             f"https://i.weread.qq.com/book/bookmarklist?bookId={book_id}",
             headers=headers,
-            timeout=15
+            timeout=15,
+            stream=True
         )
         
-        if res.status_code != 200:
-            print(f"  ❌ 书籍笔记请求失败: HTTP {res.status_code}")
-            print(f"  响应内容: {res.text[:200]}...")
-            return []
-        
-        notes_data = res.json()
-        notes = notes_data.get("updated", [])
-        
-        print(f"  ✅ 找到 {len(notes)} 条笔记")
-        processed_notes = []
-        
-        for note in notes:
-            note_type = "笔记" if note.get("abstract") else "划线"
-            content = note.get("abstract") or note.get("markText", "")
+        with res:
+            if res.status_code != 200:
+                print(f"  ❌ 书籍笔记请求失败: HTTP {res.status_code}")
+                print(f"  响应内容: {res.text[:200]}...")
+                return
             
-            # 处理可能的空内容
-            if not content.strip():
-                continue
-                
-            # 创建时间转换
-            try:
-                create_time = datetime.fromtimestamp(note["createTime"])
-            except KeyError:
-                create_time = datetime.now()
+            for note in weread_stream.iter_bookmarks(res):
+                note_type = "笔记" if note.get("abstract") else "划线"
+                content = note.get("abstract") or note.get("markText", "")
                 
-            processed_notes.append({
-                "book": book_title,
-                "author": book.get("author", "未知"),
-                "date": create_time.strftime("%Y-%m-%d"),
-                "content": content[:200] + "..." if len(content) > 200 else content,
-                "type": note_type,
-                "bookId": book_id
-            })
-            
-        return processed_notes
+                # 处理可能的空内容
+                if not content.strip():
+                    continue
+                    
+                # 创建时间转换
+                try:
+                    create_time = datetime.fromtimestamp(note["createTime"])
+                except KeyError:
+                    create_time = datetime.now()
+                    
+                yield {
+                    "book": book_title,
+                    "author": book.get("author", "未知"),
+                    "date": create_time.strftime("%Y-%m-%d"),
+                    "content": content[:200] + "..." if len(content) > 200 else content,
+                    "type": note_type,
+                    "bookId": book_id
+                }
         
     except Exception as e:
         print(f"  ❌ 处理书籍失败: {str(e)}")
-        return []
 
 def sync_to_notion(note):
     """同步单条笔记到Notion"""
@@ -175,7 +160,7 @@ def sync_to_notion(note):
         return False
 
 if __name__ == "__main__":
-    books = fetch_weread_notes()
+    books = fetch_weread_notes(notebooks)
     if not books:
         print("❌ 未获取到书籍信息，同步终止")
         sys.exit(1)
@@ -186,10 +171,7 @@ if __name__ == "__main__":
     print("\n🔄 开始同步笔记到Notion...")
     for book in books[:1]:  # 只处理第一本书用于测试
         notes = process_book_notes(book)
-        if not notes:
-            continue
-            
-        for note in notes[:1]:  # 只同步第一条笔记
+        for note in itertools.islice(notes, 1):  # 只同步第一条笔记
             total_notes += 1
             if sync_to_notion(note):
                 success_count += 1
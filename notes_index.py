@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+# 本地全文索引：记录已同步到Notion的划线和笔记，离线查询
+INDEX_FILE = os.getenv("NOTES_INDEX", "notes_index.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_key TEXT PRIMARY KEY,
+    book_id TEXT NOT NULL,
+    book TEXT,
+    chapter TEXT,
+    chapter_uid INTEGER,
+    content TEXT NOT NULL,
+    date TEXT,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS notes_book_content ON notes (book_id, content);
+-- trigram 分词支持中文任意子串匹配（至少3个字符）
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    book, chapter, content, content='notes', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts(rowid, book, chapter, content) VALUES (new.rowid, new.book, new.chapter, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, book, chapter, content) VALUES ('delete', old.rowid, old.book, old.chapter, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, book, chapter, content) VALUES ('delete', old.rowid, old.book, old.chapter, old.content);
+    INSERT INTO notes_fts(rowid, book, chapter, content) VALUES (new.rowid, new.book, new.chapter, new.content);
+END;
+"""
+
+def open_index(path=INDEX_FILE):
+    """打开（必要时创建）索引数据库"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def add_note(conn, key, book_id, book, chapter, content, date, note_type, chapter_uid=None):
+    """写入或更新一条已同步的笔记"""
+    conn.execute(
+        "INSERT INTO notes (note_key, book_id, book, chapter, chapter_uid, content, date, type) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(note_key) DO UPDATE SET book_id=excluded.book_id, book=excluded.book, chapter=excluded.chapter, "
+        "chapter_uid=excluded.chapter_uid, content=excluded.content, date=excluded.date, type=excluded.type",
+        (key, book_id, book, chapter, chapter_uid, content, date, note_type)
+    )
+
+def fill_chapters(conn, book_id, chapters):
+    """为缺少章节标题的笔记补全标题（流式解析时章节列表晚于笔记到达）"""
+    conn.executemany(
+        "UPDATE notes SET chapter = ? WHERE book_id = ? AND chapter_uid = ? AND (chapter IS NULL OR chapter = '')",
+        [(title, book_id, uid) for uid, title in chapters.items() if title]
+    )
+
+def remove_note(conn, key):
+    """从索引中删除一条笔记"""
+    conn.execute("DELETE FROM notes WHERE note_key = ?", (key,))
+
+def matching_keys(conn, book_id, chapter_uid, content):
+    """同一本书同一章节中已同步过的相同内容的划线/笔记，返回其 note_key 列表
+
+    不同章节中的相同段落视为不同的划线。
+    """
+    rows = conn.execute(
+        "SELECT note_key FROM notes WHERE book_id = ? AND chapter_uid IS ? AND content = ?",
+        (book_id, chapter_uid, content)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def _like(text):
+    """包含 text 的 LIKE 模式，转义通配符 % 和 _"""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def search(conn, query, book=None, limit=20):
+    """全文搜索，返回 (书名, 章节, 日期, 类型, 内容) 列表"""
+    params = []
+    if len(query) >= 3:
+        # trigram 分词按3字符切分，引号包裹避免查询语法被误解析
+        sql = ("SELECT n.book, n.chapter, n.date, n.type, n.content FROM notes_fts "
+               "JOIN notes n ON n.rowid = notes_fts.rowid WHERE notes_fts MATCH ?")
+        params.append('"' + query.replace('"', '""') + '"')
+    else:
+        # 少于3个字符无法使用 trigram 索引，退化为 LIKE 扫描
+        sql = "SELECT book, chapter, date, type, content FROM notes n WHERE n.content LIKE ? ESCAPE '\\'"
+        params.append(_like(query))
+    if book:
+        sql += " AND n.book LIKE ? ESCAPE '\\'"
+        params.append(_like(book))
+    sql += " ORDER BY n.date DESC LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="搜索已同步的微信读书划线和笔记")
+    parser.add_argument("query", help="搜索关键词")
+    parser.add_argument("--book", help="只搜索书名包含该关键词的书籍")
+    parser.add_argument("--limit", type=int, default=20, help="最多返回条数（默认20）")
+    parser.add_argument("--index", default=INDEX_FILE, help=f"索引文件路径（默认 {INDEX_FILE}）")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.exists(args.index):
+        print(f"❌ 索引文件不存在: {args.index}，请先运行同步脚本")
+        sys.exit(1)
+
+    conn = open_index(args.index)
+    started = time.perf_counter()
+    rows = search(conn, args.query, args.book, args.limit)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    for book, chapter, date, note_type, content in rows:
+        print(f"《{book}》 {chapter or ''} [{note_type}] {date}")
+        print(f"  {content}")
+    print(f"共找到 {len(rows)} 条结果 ({elapsed:.1f} ms)")
@@ -0,0 +1,88 @@
+import os
+import time
+import json
+import hashlib
+from datetime import datetime
+import sync_state
+
+# 阅读进度数据库：每本书一条记录，数据直接取自 shelf/sync 响应，不额外请求
+PROGRESS_DATABASE_ID = os.getenv("PROGRESS_DATABASE_ID")
+
+# 已写入的进度记录单独保存，不与 sync_script 读写、合并的笔记状态文件共用，避免并发运行时互相覆盖
+PROGRESS_STATE = os.getenv("PROGRESS_STATE", "progress_state.json")
+
+def load_progress_state(path=PROGRESS_STATE):
+    """读取已写入的进度记录 {bookId: {"page", "hash"}}
+
+    文件不存在时沿用旧版本保存在笔记状态文件 progress 字段中的记录，避免重复新建。
+    """
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return dict(sync_state.load_state().get("progress", {}))
+
+def extract_progress(shelf):
+    """从 shelf/sync 响应中提取每本书的阅读进度、阅读时长、读完状态和最后阅读时间"""
+    books = {book["bookId"]: book for book in shelf.get("books", []) if "bookId" in book}
+    progress = {}
+    for item in shelf.get("bookProgress", []):
+        book_id = item.get("bookId")
+        if not book_id:
+            continue
+        book = books.get(book_id, {})
+        progress[book_id] = {
+            "progress": item.get("progress", 0),
+            "readingTime": item.get("readingTime", 0),
+            "finished": bool(book.get("finishReading")),
+            "lastRead": item.get("updateTime") or book.get("readUpdateTime") or 0,
+        }
+    return progress
+
+def build_properties(book, record):
+    """构建阅读进度记录的Notion页面属性"""
+    properties = {
+        "书名": {"title": [{"text": {"content": book["title"]}}]},
+        "作者": {"rich_text": [{"text": {"content": book.get("author", "未知")}}]},
+        "书籍ID": {"rich_text": [{"text": {"content": book["bookId"]}}]},
+        "阅读进度": {"number": record["progress"]},
+        "阅读时长": {"number": round(record["readingTime"] / 60)},
+        "已读完": {"checkbox": record["finished"]},
+    }
+    if record["lastRead"]:
+        last_read = datetime.fromtimestamp(record["lastRead"]).astimezone()
+        properties["最后阅读"] = {"date": {"start": last_read.isoformat(timespec="seconds")}}
+    return properties
+
+def sync_progress(notion_client, books, progress, database_id=PROGRESS_DATABASE_ID, state_file=PROGRESS_STATE):
+    """把阅读进度写入Notion，仅在数值变化时新建或更新记录，返回写入条数"""
+    if not database_id or not progress:
+        return 0
+
+    synced = load_progress_state(state_file)
+    written = 0
+    for book in books:
+        record = progress.get(book["bookId"])
+        if record is None:
+            continue
+        digest = hashlib.md5(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+        previous = synced.get(book["bookId"], {})
+        if previous.get("hash") == digest:
+            continue
+        try:
+            properties = build_properties(book, record)
+            if previous.get("page"):
+                notion_client.pages.update(page_id=previous["page"], properties=properties)
+                page_id = previous["page"]
+            else:
+                page = notion_client.pages.create(parent={"database_id": database_id}, properties=properties)
+                page_id = page.get("id")
+            synced[book["bookId"]] = {"page": page_id, "hash": digest}
+            written += 1
+            print(f"已更新阅读进度: 《{book['title']}》 {record['progress']}%")
+            time.sleep(0.3)
+        except Exception as e:
+            print(f"阅读进度同步失败: 《{book['title']}》 {str(e)}")
+
+    if written:
+        sync_state.save_state(synced, state_file)
+    return written
@@ -1,8 +1,16 @@
 import os
+import sys
+import argparse
 import requests
 from notion_client import Client
 from datetime import datetime
 import time
+import sqlite3
+import sync_state
+import dead_letter
+import notes_index
+import weread_stream
+import highlight_merge
 
 # 环境变量配置
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -12,6 +20,17 @@ WR_COOKIE = os.getenv("WR_COOKIE")
 # 初始化Notion客户端
 notion = Client(auth=NOTION_TOKEN)
 
+# 截止时间前预留的安全余量（秒）：单条笔记写入、单本书处理的预估耗时
+NOTE_MARGIN = 2
+BOOK_MARGIN = 5
+
+# Notion API 限速（次/秒），以及每本书处理完后的等待时间（秒）
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+BOOK_INTERVAL = 1
+
+# 单次Notion API调用的预估耗时（秒）：每次调用完成后才按限速等待，用于 --plan 估算耗时
+NOTION_CALL_LATENCY = float(os.getenv("NOTION_CALL_LATENCY", "0.5"))
+
 def get_books():
     """获取书架图书列表"""
     headers = {
@@ -33,8 +52,17 @@ def get_books():
         print(f"请求异常: {str(e)}")
     return []
 
-def get_notes(book_id):
-    """获取图书笔记"""
+def get_notes(book_id, fetch=None):
+    """流式获取图书笔记：边下载边解析，逐条产出
+
+    fetch 字典收集抓取结果：chapters 为章节标题（已知时附在笔记的 chapterTitle 字段上），
+    complete 表示响应完整解析、包含 "updated" 字段且没有错误码，只有完整抓取的书
+    才会据此归档已删除的笔记。
+    """
+    if fetch is None:
+        fetch = {}
+    chapters = fetch.setdefault("chapters", {})
+    fetch["complete"] = False
     headers = {
         "Cookie": WR_COOKIE,
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -43,56 +71,317 @@ def get_notes(book_id):
         response = requests.get(
             f"https://i.weread.qq.com/book/bookmarklist?bookId={book_id}",
             headers=headers,
-            timeout=10
+            timeout=10,
+            stream=True
         )
-        if response.status_code == 200:
-            return response.json().get("updated", [])
-    except:
-        pass
-    return []
+        with response:
+            if response.status_code != 200:
+                print(f"  获取笔记失败: HTTP {response.status_code}")
+                return
+            result = {}
+            for note in weread_stream.iter_bookmarks(response, chapters, result):
+                note["chapterTitle"] = chapters.get(note.get("chapterUid"), "")
+                yield note
+        if result.get("errcode"):
+            print(f"  获取笔记失败: {result.get('errmsg', '')} (errcode {result['errcode']})")
+        fetch["complete"] = weread_stream.is_complete(result)
+    except Exception as e:
+        print(f"  获取笔记异常: {str(e)}")
 
-def sync_to_notion(book, notes):
-    """同步单本书笔记到Notion"""
-    if not notes:
-        return 0
-        
+def note_content(note):
+    """笔记正文：有想法时为想法，否则为划线原文"""
+    return note.get("abstract") or note.get("markText", "")
+
+def book_priority(book):
+    """书籍优先级：最近有阅读/笔记更新的在前，其次是笔记数多的"""
+    recent = book.get("sort") or book.get("readUpdateTime") or book.get("updateTime") or 0
+    count = book.get("noteCount", 0) + book.get("reviewCount", 0) + book.get("bookmarkCount", 0)
+    return (recent, count)
+
+def schedule_books(books):
+    """按优先级排序书籍，保证时间预算内最有价值的更新先同步"""
+    return sorted(books, key=book_priority, reverse=True)
+
+def time_left(deadline):
+    """距截止时间的剩余秒数，未设置截止时间时为无穷大"""
+    if deadline is None:
+        return float("inf")
+    return deadline - time.monotonic()
+
+def build_properties(book, note):
+    """构建单条笔记的Notion页面属性"""
+    # 确定笔记类型
+    note_type = "笔记" if note.get("abstract") else "划线"
+    
+    # 创建时间转换
+    create_time = datetime.fromtimestamp(note["createTime"])
+    
+    return {
+        "书名": {"title": [{"text": {"content": book["title"]}}]},
+        "作者": {"rich_text": [{"text": {"content": book.get("author", "未知")}}]},
+        "阅读日期": {"date": {"start": create_time.strftime("%Y-%m-%d")}},
+        "类型": {"select": {"name": note_type}},
+        "内容": {"rich_text": [{"text": {"content": note_content(note)}}]},
+        "书籍ID": {"rich_text": [{"text": {"content": book["bookId"]}}]},
+    }
+
+def write_index(index, func, *args):
+    """写入本地索引并立即提交，不长时间占用写锁（多个分片进程可共用同一索引）
+
+    索引只用于离线搜索和去重，写入失败不影响已完成的Notion写入和同步状态。
+    """
+    if index is None:
+        return
+    try:
+        func(index, *args)
+        index.commit()
+    except sqlite3.Error as e:
+        index.rollback()
+        print(f"  索引写入失败: {str(e)}")
+
+def index_note(index, key, book, note, properties):
+    """把已写入Notion的笔记记入本地索引"""
+    write_index(index, notes_index.add_note, key, book["bookId"], book["title"], note.get("chapterTitle", ""),
+                note_content(note), properties["阅读日期"]["date"]["start"],
+                properties["类型"]["select"]["name"], note.get("chapterUid"))
+
+def archive_removed(book, entry, seen, index=None):
+    """归档微信读书中已删除的笔记对应的Notion页面"""
+    archived = 0
+    for key in sync_state.removed_keys(entry, seen):
+        try:
+            notion.pages.update(page_id=entry["notes"][key]["page"], archived=True)
+            del entry["notes"][key]
+            write_index(index, notes_index.remove_note, key)
+            archived += 1
+            time.sleep(1 / NOTION_RATE_LIMIT)
+        except Exception as e:
+            print(f"归档失败: {str(e)}")
+    if archived:
+        print(f"已归档: 《{book['title']}》{archived} 条已删除的笔记")
+    return archived
+
+def sync_to_notion(book, notes, entry, deadline=None, dead_letters=None, index=None, fetch=None,
+                   update=False, archive=False):
+    """同步单本书笔记到Notion：新建新笔记；update 为真时更新内容有变化的笔记
+
+    写入失败的笔记连同已构建的请求参数加入 dead_letters 死信队列（由调用方保存），
+    并在状态中标记为待重试。
+    传入本地索引时，同一本书中内容已同步过的新笔记先暂缓；整本书抓取完后，若原笔记
+    已不在本次抓取中（删除后重新划线），且将被归档，则照常新建，否则跳过。
+    archive 为真、且传入的 fetch 表明抓取完整且未因截止时间中断时，归档已删除的笔记。
+    """
     success_count = 0
-    for note in notes:
+    seen = set()
+    deferred = []
+    
+    def write(note, key, content, action, record):
+        payload = None
         try:
-            # 确定笔记类型
-            note_type = "笔记" if note.get("abstract") else "划线"
-            
-            # 创建时间转换
-            create_time = datetime.fromtimestamp(note["createTime"])
-            
-            # 创建Notion页面属性
-            properties = {
-                "书名": {"title": [{"text": {"content": book["title"]}}]},
-                "作者": {"rich_text": [{"text": {"content": book.get("author", "未知")}}]},
-                "阅读日期": {"date": {"start": create_time.strftime("%Y-%m-%d")}},
-                "类型": {"select": {"name": note_type}},
-                "内容": {"rich_text": [{"text": {"content": note.get("abstract") or note.get("markText", "")}}]},
-                "书籍ID": {"rich_text": [{"text": {"content": book["bookId"]}}]},
-            }
-            
-            # 创建页面
-            notion.pages.create(
-                parent={"database_id": DATABASE_ID},
-                properties=properties
-            )
-            success_count += 1
-            print(f"已同步: 《{book['title']}》- {note_type}")
-            time.sleep(0.3)
+            properties = build_properties(book, note)
+            if action == "update":
+                notion.pages.update(page_id=record["page"], properties=properties)
+                record["hash"] = sync_state.content_hash(content)
+                print(f"已更新: 《{book['title']}》- {properties['类型']['select']['name']}")
+            else:
+                # 创建页面
+                payload = {"parent": {"database_id": DATABASE_ID}, "properties": properties}
+                page = notion.pages.create(**payload)
+                entry["notes"][key] = {"page": page.get("id"), "hash": sync_state.content_hash(content)}
+                print(f"已同步: 《{book['title']}》- {properties['类型']['select']['name']}")
         except Exception as e:
             print(f"同步失败: {str(e)}")
+            if payload and dead_letters is not None:
+                # 章节标题通常晚于笔记到达，此时多为空，只记录 chapterUid，标题由 fill_chapters 补全
+                meta = {"bookId": book["bookId"], "key": key, "chapterUid": note.get("chapterUid")}
+                dead_letter.push_dead_letter(dead_letters, payload, e, meta)
+                entry["notes"][key] = {"page": None, "hash": sync_state.content_hash(content)}
+            return False
+        # 状态已记录页面ID后再写索引，索引失败不会导致重复创建
+        index_note(index, key, book, note, properties)
+        time.sleep(1 / NOTION_RATE_LIMIT)
+        return True
     
+    for note in notes:
+        if time_left(deadline) < NOTE_MARGIN:
+            print("⏰ 即将到达截止时间，停止同步本书剩余笔记")
+            break
+        key = sync_state.note_key(note)
+        seen.add(key)
+        content = note_content(note)
+        record = entry["notes"].get(key)
+        action = sync_state.note_action(record, content)
+        if action is None or (action == "update" and not update):
+            continue
+        if action == "create" and index is not None:
+            matches = notes_index.matching_keys(index, book["bookId"], note.get("chapterUid"), content)
+            if matches:
+                deferred.append((note, key, content, matches))
+                continue
+        if write(note, key, content, action, record):
+            success_count += 1
+    else:
+        if archive and fetch is not None and fetch.get("complete"):
+            # 先新建重新划线的笔记，再归档原笔记，避免内容在Notion中短暂消失
+            for note, key, content, matches in deferred:
+                if seen.isdisjoint(matches) and write(note, key, content, "create", None):
+                    success_count += 1
+            archive_removed(book, entry, seen, index)
+    
+    skipped = sum(1 for _, key, _, _ in deferred if key not in entry["notes"])
+    if skipped:
+        print(f"已存在相同内容，跳过: 《{book['title']}》{skipped} 条")
     return success_count
 
+def retry_dead_letters(state, dead_letters, index=None, deadline=None):
+    """优先重试上次运行失败的写入，返回 (成功数, 剩余队列)
+
+    成功后回填状态中的页面ID并更新索引；被搁置的请求删除其待重试记录，
+    笔记在下次抓取时按新笔记重新创建，不会因搁置而永久丢失。
+    """
+    def mark_synced(item, page):
+        meta = item.get("meta", {})
+        book = state["books"].get(meta.get("bookId"))
+        if book is not None and meta.get("key"):
+            props = item["payload"]["properties"]
+            content = props["内容"]["rich_text"][0]["text"]["content"]
+            book["notes"][meta["key"]] = {"page": page.get("id"), "hash": sync_state.content_hash(content)}
+            write_index(index, notes_index.add_note, meta["key"], meta["bookId"], book.get("title", ""), "",
+                        content, props["阅读日期"]["date"]["start"], props["类型"]["select"]["name"],
+                        meta.get("chapterUid"))
+    
+    def release(item):
+        meta = item.get("meta", {})
+        book = state["books"].get(meta.get("bookId"))
+        if book is not None and not book["notes"].get(meta.get("key"), {}).get("page"):
+            book["notes"].pop(meta.get("key"), None)
+    
+    return dead_letter.retry_dead_letters(notion, dead_letters, on_success=mark_synced, on_park=release,
+                                          deadline=deadline, margin=NOTE_MARGIN, interval=1 / NOTION_RATE_LIMIT)
+
+def plan_sync(books, state, index=None, merge=False, dead_letter_file=dead_letter.DEAD_LETTER_FILE, budget=None,
+              update=False, archive=False):
+    """演练同步：抓取微信读书并与本地状态比对，统计新建/更新/归档数量，不访问Notion
+
+    更新、归档只在对应开关开启时计入API调用次数和预计耗时。
+    budget 为本次运行的时间预算（秒），预计耗时超出时给出提示。
+    """
+    totals = {"create": 0, "update": 0, "archive": 0, "skip": 0}
+    fetch_time = 0
+    for book in books:
+        entry = state["books"].get(book["bookId"], {"notes": {}})
+        started = time.monotonic()
+        fetch = {}
+        notes = get_notes(book["bookId"], fetch)
+        if merge:
+            notes = highlight_merge.merge_highlights(notes, entry["notes"])
+        counts = dict.fromkeys(totals, 0)
+        seen = set()
+        deferred = []
+        for note in notes:
+            key = sync_state.note_key(note)
+            seen.add(key)
+            content = note_content(note)
+            action = sync_state.note_action(entry["notes"].get(key), content)
+            if action == "create" and index is not None:
+                matches = notes_index.matching_keys(index, book["bookId"], note.get("chapterUid"), content)
+                if matches:
+                    deferred.append(matches)
+                    continue
+            if action:
+                counts[action] += 1
+        complete = fetch.get("complete")
+        for matches in deferred:
+            # 与 sync_to_notion 一致：原笔记已删除且将被归档时才新建
+            counts["create" if archive and complete and seen.isdisjoint(matches) else "skip"] += 1
+        if complete:
+            counts["archive"] = len(sync_state.removed_keys(entry, seen))
+        fetch_time += time.monotonic() - started
+        
+        if counts["create"] or counts["update"] or counts["archive"]:
+            print(f"《{book['title']}》: 新建 {counts['create']}, 更新 {counts['update']}, 归档 {counts['archive']}")
+        for action, count in counts.items():
+            totals[action] += count
+        time.sleep(BOOK_INTERVAL)
+    
+    pending = len(dead_letter.pending_dead_letters(dead_letter.load_dead_letters(dead_letter_file)))
+    calls = (totals["create"] + (totals["update"] if update else 0)
+             + (totals["archive"] if archive else 0) + pending)
+    # 每次调用耗时加上调用后的限速等待；实际同步时每本书重新抓取一次笔记，抓取耗时按本次演练实测计入
+    eta = calls * (NOTION_CALL_LATENCY + 1 / NOTION_RATE_LIMIT) + len(books) * BOOK_INTERVAL + fetch_time
+    
+    print("="*60)
+    print("📋 同步计划（未写入Notion）")
+    print(f"  书籍: {len(books)} 本")
+    print(f"  新建: {totals['create']} 条")
+    print(f"  更新: {totals['update']} 条" + ("" if update else "（未开启 --update-changed，不会执行）"))
+    print(f"  归档: {totals['archive']} 条" + ("" if archive else "（未开启 --archive-removed，不会执行）"))
+    print(f"  死信重试: {pending} 条")
+    print(f"  跳过（索引中已有相同内容）: {totals['skip']} 条")
+    print(f"  Notion API 调用: {calls} 次（限速 {NOTION_RATE_LIMIT:g} 次/秒，单次预估 {NOTION_CALL_LATENCY:g} 秒）")
+    print(f"  预计耗时: {int(eta // 60)}分{int(eta % 60)}秒")
+    if budget is not None and eta > budget:
+        print(f"⚠️ 预计耗时超过时间预算 {budget:g} 秒，需要多次运行或分片同步")
+    print("="*60)
+    return totals
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="微信读书同步到Notion")
+    parser.add_argument("--shard", help="只同步指定分片的书籍，格式 i/N（0 <= i < N）")
+    parser.add_argument("--merge-state", nargs="+", metavar="FILE",
+                        help="合并分片状态文件到主状态文件后退出")
+    parser.add_argument("--merge-highlights", action="store_true",
+                        default=os.getenv("MERGE_HIGHLIGHTS") == "1",
+                        help="写入前合并同一章节中重叠或相邻的划线")
+    parser.add_argument("--plan", action="store_true",
+                        help="只抓取微信读书并与本地状态比对，输出同步计划、API调用次数和预计耗时，不写入Notion")
+    parser.add_argument("--update-changed", action="store_true",
+                        help="更新内容有变化的已同步笔记（会覆盖Notion中对应页面的属性）")
+    parser.add_argument("--archive-removed", action="store_true",
+                        help="归档微信读书中已删除的笔记对应的Notion页面")
+    parser.add_argument("--deadline", type=float, default=os.getenv("SYNC_DEADLINE"),
+                        help="本次运行的时间预算（秒），到期前停止同步")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    deadline = time.monotonic() + float(args.deadline) if args.deadline else None
+    
+    if args.merge_state:
+        # 分片写入失败的笔记只在分片死信队列中，需一并合并，否则合并后的状态会永远跳过它们
+        queue = dead_letter.merge_dead_letters(sync_state.shard_files(dead_letter.DEAD_LETTER_FILE))
+        merged = sync_state.merge_states(args.merge_state, pending=dead_letter.queued_keys(queue))
+        print(f"✅ 状态合并完成! 共 {len(merged['books'])} 本书")
+        sys.exit(0)
+    
+    state_file = sync_state.STATE_FILE
+    dead_letter_file = dead_letter.DEAD_LETTER_FILE
+    shard = None
+    if args.shard:
+        try:
+            shard = sync_state.parse_shard(args.shard)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(2)
+        state_file = sync_state.shard_state_file(*shard)
+        dead_letter_file = sync_state.shard_state_file(*shard, base=dead_letter_file)
+    
     print("="*60)
     print("微信读书同步到Notion")
     print("="*60)
     
+    state = sync_state.load_shard_state(*shard) if shard else sync_state.load_state(state_file)
+    index = notes_index.open_index()
+    
+    # 优先重试死信队列，无需重新抓取微信读书
+    retried = 0
+    dead_letters = dead_letter.load_dead_letters(dead_letter_file)
+    if not args.plan and dead_letter.pending_dead_letters(dead_letters):
+        retried, dead_letters = retry_dead_letters(state, dead_letters, index, deadline)
+        dead_letter.save_dead_letters(dead_letters, dead_letter_file)
+        sync_state.save_state(state, state_file)
+    
     # 获取书籍列表
     books = get_books()
     if not books:
@@ -101,21 +390,48 @@ if __name__ == "__main__":
         exit(1)
     
     print(f"获取到 {len(books)} 本书籍")
+    if shard:
+        books = sync_state.filter_shard(books, *shard)
+        print(f"分片 {shard[0]}/{shard[1]}: 本分片负责 {len(books)} 本书籍")
+    
+    books = schedule_books(books)
+    
+    if args.plan:
+        plan_sync(books, state, index, args.merge_highlights, dead_letter_file,
+                  float(args.deadline) if args.deadline else None, args.update_changed, args.archive_removed)
+        sys.exit(0)
     
     # 同步到Notion
-    total_notes = 0
+    total_notes = retried
+    done_books = 0
+    started = time.monotonic()
     for book in books:
+        # 按已处理书籍的平均耗时预估，来不及处理下一本时提前停止
+        book_cost = (time.monotonic() - started) / done_books if done_books else BOOK_MARGIN
+        if time_left(deadline) < max(book_cost, BOOK_MARGIN):
+            print(f"⏰ 即将到达截止时间，剩余 {len(books) - done_books} 本书留待下次同步")
+            break
+        done_books += 1
         book_id = book["bookId"]
         print(f"处理书籍: 《{book['title']}》")
-        notes = get_notes(book_id)
-        if not notes:
-            print("  未找到笔记")
-            continue
-            
-        print(f"  找到 {len(notes)} 条笔记")
-        synced = sync_to_notion(book, notes)
+        # 笔记边下载边写入，无需等待整本书的响应解析完成
+        fetch = {}
+        entry = sync_state.book_state(state, book)
+        notes = get_notes(book_id, fetch)
+        if args.merge_highlights:
+            # 合并需要整本书的划线位置，开启后按书缓冲
+            notes = highlight_merge.merge_highlights(notes, entry["notes"])
+        queued = len(dead_letters)
+        synced = sync_to_notion(book, notes, entry, deadline, dead_letters, index, fetch,
+                                args.update_changed, args.archive_removed)
+        print(f"  新同步 {synced} 条笔记")
+        write_index(index, notes_index.fill_chapters, book_id, fetch.get("chapters", {}))
+        # 死信队列每本书最多保存一次，避免故障期间每条失败都重写整个文件
+        if len(dead_letters) != queued:
+            dead_letter.save_dead_letters(dead_letters, dead_letter_file)
+        sync_state.save_state(state, state_file)
         total_notes += synced
-        time.sleep(1)
+        time.sleep(BOOK_INTERVAL)
     
     print("="*60)
     print(f"✅ 同步完成! 共处理 {total_notes} 条笔记")
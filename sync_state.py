@@ -0,0 +1,129 @@
+import os
+import glob
+import json
+import hashlib
+
+# 本地同步状态文件，记录每本书已同步到Notion的笔记
+STATE_FILE = os.getenv("SYNC_STATE", "sync_state.json")
+
+def parse_shard(value):
+    """解析分片参数 "i/N"，i 从0开始"""
+    try:
+        index, total = (int(part) for part in value.split("/", 1))
+    except ValueError:
+        raise ValueError(f"分片参数格式错误: {value}，应为 i/N")
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片参数越界: {value}，要求 0 <= i < N")
+    return index, total
+
+def shard_of(book_id, total):
+    """按bookId的稳定哈希计算所属分片"""
+    digest = hashlib.md5(str(book_id).encode("utf-8")).hexdigest()
+    return int(digest, 16) % total
+
+def filter_shard(books, index, total):
+    """只保留属于指定分片的书籍"""
+    return [book for book in books if shard_of(book["bookId"], total) == index]
+
+def shard_state_file(index, total, base=STATE_FILE):
+    """分片对应的状态文件名，如 sync_state.shard0of4.json"""
+    root, ext = os.path.splitext(base)
+    return f"{root}.shard{index}of{total}{ext or '.json'}"
+
+def shard_files(base=STATE_FILE):
+    """已存在的全部分片文件，如 sync_state.shard*of*.json"""
+    root, ext = os.path.splitext(base)
+    return sorted(glob.glob(f"{glob.escape(root)}.shard*of*{ext or '.json'}"))
+
+def note_key(note):
+    """笔记的唯一标识"""
+    return note.get("bookmarkId") or f"{note.get('bookId', '')}_{note.get('createTime', '')}"
+
+def load_state(path=STATE_FILE):
+    """读取本地同步状态，不存在时返回空状态"""
+    if not os.path.exists(path):
+        return {"books": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state.setdefault("books", {})
+    return state
+
+def save_state(state, path=STATE_FILE):
+    """写入本地同步状态（先写临时文件再替换，避免中断时损坏）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def book_state(state, book):
+    """获取（必要时创建）单本书的状态"""
+    entry = state["books"].setdefault(book["bookId"], {"title": book.get("title", ""), "notes": {}})
+    entry.setdefault("notes", {})
+    return entry
+
+def merge_book(books, book_id, entry):
+    """把单本书的状态并入 books，笔记记录取并集
+
+    同一条笔记两边都有记录时，保留已有页面ID的一方（另一方可能仍在死信队列中待重试）。
+    """
+    current = books.setdefault(book_id, {"title": entry.get("title", ""), "notes": {}})
+    notes = current.setdefault("notes", {})
+    for key, record in entry.get("notes", {}).items():
+        if key not in notes or (not notes[key].get("page") and record.get("page")):
+            notes[key] = record
+    if entry.get("title"):
+        current["title"] = entry["title"]
+
+def merge_states(paths, target=STATE_FILE, pending=None):
+    """合并多个分片状态文件到目标状态文件
+
+    各分片按bookId哈希划分，书籍互不重叠；即使同一本书出现在多个文件中，
+    也只是对笔记记录取并集，不会产生冲突。
+    传入 pending（死信队列中待重试的 (bookId, note_key) 集合）时，丢弃不在队列中的
+    无页面ID记录，使这些笔记下次抓取时重新创建，而不是永远停留在待重试状态。
+    """
+    merged = load_state(target)
+    for path in paths:
+        shard = load_state(path)
+        for book_id, entry in shard["books"].items():
+            merge_book(merged["books"], book_id, entry)
+        print(f"已合并: {path} ({len(shard['books'])} 本书)")
+    if pending is not None:
+        for book_id, entry in merged["books"].items():
+            notes = entry.get("notes", {})
+            for key in [key for key, record in notes.items()
+                        if not record.get("page") and (book_id, key) not in pending]:
+                del notes[key]
+    save_state(merged, target)
+    return merged
+
+def load_shard_state(index, total, base=STATE_FILE):
+    """读取分片状态，并以主状态文件中属于该分片的书籍补全
+
+    主状态可能来自普通运行或 --merge-state，分片文件缺失或较旧时，
+    不补全会把已同步的笔记当作新笔记重复写入Notion。
+    """
+    state = load_state(shard_state_file(index, total, base))
+    for book_id, entry in load_state(base)["books"].items():
+        if shard_of(book_id, total) == index:
+            merge_book(state["books"], book_id, entry)
+    return state
+
+def content_hash(content):
+    """笔记内容摘要，用于判断已同步的笔记是否需要更新"""
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+def note_action(record, content):
+    """根据状态记录判断笔记需要的操作：create / update / None
+
+    页面ID为空（死信队列中待重试）或缺少摘要的旧记录不做更新。
+    """
+    if record is None:
+        return "create"
+    if record.get("page") and record.get("hash") and record["hash"] != content_hash(content):
+        return "update"
+    return None
+
+def removed_keys(entry, seen):
+    """状态中有、本次抓取中已不存在的笔记，需要在Notion中归档"""
+    return [key for key, record in entry["notes"].items() if key not in seen and record.get("page")]
@@ -0,0 +1,58 @@
+import highlight_merge
+
+def mark(bookmark_id, span, text, chapter=1, create_time=0, **extra):
+    return dict(bookmarkId=bookmark_id, chapterUid=chapter, range=span, markText=text,
+                createTime=create_time, **extra)
+
+def by_key(notes):
+    return {note["bookmarkId"]: note for note in notes}
+
+def test_overlap_appends_only_new_text():
+    notes = highlight_merge.merge_highlights([mark("a", "0-3", "甲乙丙", create_time=1),
+                                              mark("b", "2-5", "丙丁戊", create_time=2)])
+    assert len(notes) == 1
+    merged = notes[0]
+    assert merged["markText"] == "甲乙丙丁戊"
+    assert merged["range"] == "0-5"
+    assert merged["mergedFrom"] == ["a", "b"]
+    assert merged["createTime"] == 2
+
+def test_containment_keeps_outer_text():
+    notes = highlight_merge.merge_highlights([mark("a", "0-5", "甲乙丙丁戊"), mark("b", "1-3", "乙丙")])
+    assert [(n["markText"], n["range"]) for n in notes] == [("甲乙丙丁戊", "0-5")]
+
+def test_adjacent_spans_are_concatenated():
+    notes = highlight_merge.merge_highlights([mark("b", "3-5", "丁戊"), mark("a", "0-3", "甲乙丙")])
+    assert [(n["markText"], n["range"]) for n in notes] == [("甲乙丙丁戊", "0-5")]
+
+def test_gap_and_other_chapter_not_merged():
+    notes = highlight_merge.merge_highlights([mark("a", "0-3", "甲乙丙"), mark("b", "4-6", "戊己"),
+                                              mark("c", "2-5", "丙丁戊", chapter=2)])
+    assert sorted(n["bookmarkId"] for n in notes) == ["a", "b", "c"]
+
+def test_notes_with_thought_pass_through():
+    thought = mark("b", "2-5", "丙丁戊", abstract="想法")
+    notes = highlight_merge.merge_highlights([mark("a", "0-3", "甲乙丙"), thought])
+    assert by_key(notes)["b"] is thought
+    assert by_key(notes)["a"]["markText"] == "甲乙丙"
+
+def test_unparsable_range_passes_through():
+    notes = highlight_merge.merge_highlights([mark("a", "", "甲"), mark("b", "5-2", "乙")])
+    assert sorted(n["bookmarkId"] for n in notes) == ["a", "b"]
+
+def test_key_is_stable_when_group_grows():
+    first = [mark("a", "0-3", "甲乙丙", create_time=1), mark("b", "2-5", "丙丁戊", create_time=2)]
+    before = highlight_merge.merge_highlights([dict(n) for n in first])
+    after = highlight_merge.merge_highlights([dict(n) for n in first] + [mark("d", "5-7", "己庚", create_time=3)])
+    assert before[0]["bookmarkId"] == after[0]["bookmarkId"] == highlight_merge.merged_key("a")
+    assert after[0]["markText"] == "甲乙丙丁戊己庚"
+
+def test_key_uses_earliest_created_member():
+    notes = highlight_merge.merge_highlights([mark("a", "0-3", "甲乙丙", create_time=5),
+                                              mark("b", "2-5", "丙丁戊", create_time=1)])
+    assert notes[0]["bookmarkId"] == highlight_merge.merged_key("b")
+
+def test_synced_highlights_are_not_merged():
+    notes = highlight_merge.merge_highlights([mark("a", "0-3", "甲乙丙"), mark("b", "2-5", "丙丁戊"),
+                                              mark("c", "4-6", "戊己")], synced={"a": {}})
+    assert sorted(n["bookmarkId"] for n in notes) == ["a", highlight_merge.merged_key("b")]
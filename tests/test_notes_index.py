@@ -0,0 +1,63 @@
+import pytest
+import notes_index
+
+@pytest.fixture
+def conn():
+    conn = notes_index.open_index(":memory:")
+    rows = [
+        ("m1", "b1", "三体", "第一章", "不要回答！不要回答！", "2024-01-02", "划线", 1),
+        ("m2", "b1", "三体", "第二章", "给岁月以文明，而不是给文明以岁月", "2024-01-03", "划线", 2),
+        ("m3", "b2", "黑暗森林", "序章", "宇宙就是一座黑暗森林", "2024-01-01", "笔记", 1),
+        ("m4", "b2", "黑暗森林", "序章", "进度 100% 完成_了", "2024-01-04", "划线", 1),
+    ]
+    for row in rows:
+        notes_index.add_note(conn, *row)
+    yield conn
+    conn.close()
+
+def contents(rows):
+    return [row[4] for row in rows]
+
+def test_trigram_search_matches_substring(conn):
+    assert contents(notes_index.search(conn, "一座黑暗")) == ["宇宙就是一座黑暗森林"]
+    # 书名、章节同样参与全文索引
+    assert contents(notes_index.search(conn, "黑暗森林")) == ["进度 100% 完成_了", "宇宙就是一座黑暗森林"]
+    assert contents(notes_index.search(conn, "给文明")) == ["给岁月以文明，而不是给文明以岁月"]
+
+def test_trigram_search_quotes_query_syntax(conn):
+    assert notes_index.search(conn, 'a" OR "b') == []
+    assert contents(notes_index.search(conn, "回答！不")) == ["不要回答！不要回答！"]
+
+def test_short_query_falls_back_to_like(conn):
+    assert contents(notes_index.search(conn, "岁月")) == ["给岁月以文明，而不是给文明以岁月"]
+    assert len(notes_index.search(conn, "不")) == 2
+
+def test_like_wildcards_are_literal(conn):
+    assert contents(notes_index.search(conn, "%")) == ["进度 100% 完成_了"]
+    assert contents(notes_index.search(conn, "_")) == ["进度 100% 完成_了"]
+    assert notes_index.search(conn, "%_") == []
+
+def test_book_filter_and_order(conn):
+    assert contents(notes_index.search(conn, "文明", book="三体")) == ["给岁月以文明，而不是给文明以岁月"]
+    assert notes_index.search(conn, "文明", book="黑暗") == []
+    assert notes_index.search(conn, "森林", book="%") == []
+    dates = [row[2] for row in notes_index.search(conn, "不", limit=5)]
+    assert dates == sorted(dates, reverse=True)
+
+def test_search_follows_updates_and_removals(conn):
+    notes_index.add_note(conn, "m3", "b2", "黑暗森林", "序章", "猜疑链", "2024-01-01", "笔记", 1)
+    assert notes_index.search(conn, "一座黑暗") == []
+    assert contents(notes_index.search(conn, "猜疑链")) == ["猜疑链"]
+    notes_index.remove_note(conn, "m1")
+    assert notes_index.search(conn, "不要回答") == []
+
+def test_matching_keys_respects_chapter(conn):
+    assert notes_index.matching_keys(conn, "b1", 1, "不要回答！不要回答！") == ["m1"]
+    assert notes_index.matching_keys(conn, "b1", 2, "不要回答！不要回答！") == []
+    assert notes_index.matching_keys(conn, "b2", 1, "不要回答！不要回答！") == []
+
+def test_fill_chapters_only_fills_missing_titles(conn):
+    notes_index.add_note(conn, "m5", "b1", "三体", "", "消灭人类暴政", "2024-01-05", "划线", 3)
+    notes_index.fill_chapters(conn, "b1", {1: "新标题", 3: "第三章"})
+    chapters = dict(conn.execute("SELECT note_key, chapter FROM notes WHERE book_id = 'b1'").fetchall())
+    assert chapters == {"m1": "第一章", "m2": "第二章", "m5": "第三章"}
@@ -0,0 +1,67 @@
+import json
+import reading_progress
+
+SHELF = {
+    "books": [
+        {"bookId": "b1", "title": "三体", "finishReading": 1, "readUpdateTime": 1700000100},
+        {"bookId": "b2", "title": "球状闪电", "finishReading": 0, "readUpdateTime": 1700000200},
+        {"title": "缺少ID"},
+    ],
+    "bookProgress": [
+        {"bookId": "b1", "progress": 100, "readingTime": 36000, "updateTime": 1700000300},
+        {"bookId": "b2", "progress": 42, "readingTime": 600},
+        {"bookId": "b3"},
+        {"progress": 10},
+    ],
+}
+
+def test_extract_progress():
+    assert reading_progress.extract_progress(SHELF) == {
+        "b1": {"progress": 100, "readingTime": 36000, "finished": True, "lastRead": 1700000300},
+        "b2": {"progress": 42, "readingTime": 600, "finished": False, "lastRead": 1700000200},
+        "b3": {"progress": 0, "readingTime": 0, "finished": False, "lastRead": 0},
+    }
+
+def test_extract_progress_empty_shelf():
+    assert reading_progress.extract_progress({}) == {}
+    assert reading_progress.extract_progress({"books": SHELF["books"]}) == {}
+
+def test_build_properties_omits_missing_last_read():
+    book = {"bookId": "b3", "title": "流浪地球"}
+    record = {"progress": 0, "readingTime": 90, "finished": False, "lastRead": 0}
+    properties = reading_progress.build_properties(book, record)
+    assert properties["阅读时长"] == {"number": 2}
+    assert properties["作者"]["rich_text"][0]["text"]["content"] == "未知"
+    assert "最后阅读" not in properties
+
+class FakePages:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(("create", kwargs))
+        return {"id": f"p{len(self.calls)}"}
+
+    def update(self, **kwargs):
+        self.calls.append(("update", kwargs))
+
+class FakeNotion:
+    def __init__(self):
+        self.pages = FakePages()
+
+def test_sync_progress_writes_only_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(reading_progress.time, "sleep", lambda seconds: None)
+    state_file = tmp_path / "progress_state.json"
+    books = [book for book in SHELF["books"] if "bookId" in book]
+    progress = reading_progress.extract_progress(SHELF)
+    notion = FakeNotion()
+
+    assert reading_progress.sync_progress(notion, books, progress, "db", str(state_file)) == 2
+    assert reading_progress.sync_progress(notion, books, progress, "db", str(state_file)) == 0
+    progress["b2"]["progress"] = 50
+    assert reading_progress.sync_progress(notion, books, progress, "db", str(state_file)) == 1
+
+    assert [call[0] for call in notion.pages.calls] == ["create", "create", "update"]
+    assert notion.pages.calls[2][1]["page_id"] == "p2"
+    assert set(json.loads(state_file.read_text(encoding="utf-8"))) == {"b1", "b2"}
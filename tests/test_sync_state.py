@@ -0,0 +1,76 @@
+import json
+import hashlib
+import pytest
+import sync_state
+
+def write(path, books):
+    path.write_text(json.dumps({"books": books}, ensure_ascii=False), encoding="utf-8")
+
+def test_parse_shard():
+    assert sync_state.parse_shard("0/4") == (0, 4)
+    assert sync_state.parse_shard("3/4") == (3, 4)
+    for value in ("4/4", "-1/4", "0/0", "1", "a/b"):
+        with pytest.raises(ValueError):
+            sync_state.parse_shard(value)
+
+def test_shard_of_is_stable_and_partitions():
+    ids = [f"book{i}" for i in range(200)]
+    # 使用md5而非内置hash()，结果不随进程的哈希随机化变化
+    for book_id in ("b1", "b2", 12345):
+        assert sync_state.shard_of(book_id, 4) == int(hashlib.md5(str(book_id).encode()).hexdigest(), 16) % 4
+    assert [sync_state.shard_of(book_id, 4) for book_id in ids] == [sync_state.shard_of(book_id, 4) for book_id in ids]
+    books = [{"bookId": book_id} for book_id in ids]
+    shards = [sync_state.filter_shard(books, index, 4) for index in range(4)]
+    assert sorted(book["bookId"] for shard in shards for book in shard) == sorted(ids)
+    assert all(shards)
+
+def test_shard_file_names(tmp_path):
+    base = str(tmp_path / "sync_state.json")
+    assert sync_state.shard_state_file(1, 4, base) == str(tmp_path / "sync_state.shard1of4.json")
+    for index in (0, 2):
+        write(tmp_path / f"sync_state.shard{index}of4.json", {})
+    (tmp_path / "sync_state.json").write_text("{}", encoding="utf-8")
+    assert sync_state.shard_files(base) == [sync_state.shard_state_file(index, 4, base) for index in (0, 2)]
+
+def test_merge_book_prefers_page_id():
+    books = {"b1": {"title": "", "notes": {"n1": {"page": None, "hash": "h"}, "n2": {"page": "p2", "hash": "h"}}}}
+    sync_state.merge_book(books, "b1", {"title": "三体", "notes": {
+        "n1": {"page": "p1", "hash": "h"}, "n2": {"page": None, "hash": "x"}, "n3": {"page": "p3", "hash": "h"},
+    }})
+    assert books["b1"] == {"title": "三体", "notes": {
+        "n1": {"page": "p1", "hash": "h"}, "n2": {"page": "p2", "hash": "h"}, "n3": {"page": "p3", "hash": "h"},
+    }}
+
+def test_merge_states(tmp_path):
+    target = tmp_path / "sync_state.json"
+    write(target, {"b1": {"title": "三体", "notes": {"n1": {"page": "p1", "hash": "h"}}}})
+    write(tmp_path / "s0.json", {"b1": {"title": "三体", "notes": {"n1": {"page": None, "hash": "h"},
+                                                                   "n2": {"page": None, "hash": "h"}}}})
+    write(tmp_path / "s1.json", {"b2": {"title": "球状闪电", "notes": {"n3": {"page": None, "hash": "h"}}}})
+    merged = sync_state.merge_states([str(tmp_path / "s0.json"), str(tmp_path / "s1.json")], str(target),
+                                     pending={("b1", "n2")})
+    assert merged["books"]["b1"]["notes"] == {"n1": {"page": "p1", "hash": "h"}, "n2": {"page": None, "hash": "h"}}
+    # 不在死信队列中的无页面ID记录被丢弃，下次抓取时重新创建
+    assert merged["books"]["b2"]["notes"] == {}
+    assert sync_state.load_state(str(target)) == merged
+
+def test_load_shard_state_seeds_from_main_state(tmp_path):
+    base = str(tmp_path / "sync_state.json")
+    ids = [f"book{i}" for i in range(20)]
+    write(tmp_path / "sync_state.json", {book_id: {"title": book_id, "notes": {"n": {"page": "p", "hash": "h"}}}
+                                         for book_id in ids})
+    mine = [book_id for book_id in ids if sync_state.shard_of(book_id, 4) == 1]
+    write(tmp_path / "sync_state.shard1of4.json", {mine[0]: {"title": mine[0], "notes": {
+        "n": {"page": None, "hash": "h"}, "new": {"page": "p2", "hash": "h"}}}})
+    state = sync_state.load_shard_state(1, 4, base)
+    assert sorted(state["books"]) == sorted(mine)
+    assert state["books"][mine[0]]["notes"] == {"n": {"page": "p", "hash": "h"}, "new": {"page": "p2", "hash": "h"}}
+
+def test_note_action_and_removed_keys():
+    digest = sync_state.content_hash("内容")
+    assert sync_state.note_action(None, "内容") == "create"
+    assert sync_state.note_action({"page": "p", "hash": digest}, "内容") is None
+    assert sync_state.note_action({"page": "p", "hash": digest}, "新内容") == "update"
+    assert sync_state.note_action({"page": None, "hash": digest}, "新内容") is None
+    entry = {"notes": {"a": {"page": "p"}, "b": {"page": "p"}, "c": {"page": None}}}
+    assert sync_state.removed_keys(entry, {"a"}) == ["b"]
@@ -0,0 +1,86 @@
+import json
+import pytest
+import weread_stream
+
+BOOKMARKS = {
+    "synckey": 1700000000,
+    "updated": [
+        {"bookmarkId": "m1", "chapterUid": 12, "range": "0-3", "markText": "黑暗森林", "createTime": 1700000001},
+        {"bookmarkId": "m2", "chapterUid": 7, "range": "10-25", "markText": "引号\"和\\反斜杠\n换行 😀", "createTime": -1.5e3},
+    ],
+    "chapters": [{"chapterUid": 12, "title": "第一章"}, {"chapterUid": 7, "title": "序章 Prologue"}],
+    "book": {"title": "三体", "price": 0.0, "finished": True, "cover": None},
+}
+
+class FakeResponse:
+    """按给定字节边界切分响应体，模拟 iter_content"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+def split_at(data, offset):
+    return [data[:offset], data[offset:]]
+
+def one_byte(data):
+    return [data[i:i + 1] for i in range(len(data))]
+
+def all_splits(data):
+    """在每个字节偏移处切成两段，外加逐字节切分"""
+    for offset in range(len(data) + 1):
+        yield split_at(data, offset)
+    yield one_byte(data)
+
+def parse(chunks):
+    chapters, result = {}, {}
+    notes = list(weread_stream.iter_bookmarks(FakeResponse(chunks), chapters, result))
+    return notes, chapters, result
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_bookmarks_every_split(indent):
+    data = json.dumps(BOOKMARKS, ensure_ascii=False, indent=indent).encode("utf-8")
+    expected_chapters = {c["chapterUid"]: c["title"] for c in BOOKMARKS["chapters"]}
+    for chunks in all_splits(data):
+        notes, chapters, result = parse(chunks)
+        assert notes == BOOKMARKS["updated"]
+        assert chapters == expected_chapters
+        assert result["keys"] == set(BOOKMARKS)
+        assert weread_stream.is_complete(result)
+
+def test_numbers_truncated_at_chunk_end():
+    values = [0, 7, -12, 3.25, 1e10, -2.5E-3, 12345678901234567890]
+    data = json.dumps({"updated": values, "synckey": 98765}).encode("utf-8")
+    for chunks in all_splits(data):
+        assert list(weread_stream.iter_object_stream(weread_stream.iter_text(FakeResponse(chunks)), "updated")) == values
+
+def test_other_values_passed_to_on_value():
+    data = json.dumps({"a": 123, "updated": [], "b": "文字", "c": [1, {"d": None}]}, ensure_ascii=False).encode("utf-8")
+    for chunks in all_splits(data):
+        values = {}
+        text = weread_stream.iter_text(FakeResponse(chunks))
+        assert list(weread_stream.iter_object_stream(text, "updated", values.__setitem__)) == []
+        assert values == {"a": 123, "b": "文字", "c": [1, {"d": None}]}
+
+@pytest.mark.parametrize("body, complete", [
+    ({}, False),
+    ({"updated": []}, True),
+    ({"synckey": 1, "chapters": []}, False),
+    ({"errcode": -2012, "errmsg": "登录超时"}, False),
+    ({"updated": [], "errcode": 0}, True),
+    ({"updated": [], "errcode": -2010}, False),
+])
+def test_empty_missing_and_error(body, complete):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    for chunks in all_splits(data):
+        notes, _, result = parse(chunks)
+        assert notes == []
+        assert result["keys"] == set(body)
+        assert result.get("errcode") == body.get("errcode")
+        assert weread_stream.is_complete(result) is complete
+
+@pytest.mark.parametrize("data", [b"", b"{", b'{"updated": [1, 2', b'{"updated": [{"a": 1}] ', b"[]"])
+def test_truncated_or_invalid(data):
+    with pytest.raises(ValueError):
+        parse(one_byte(data))
@@ -0,0 +1,127 @@
+import json
+import codecs
+
+# 流式解析微信读书 bookmarklist 响应：边下载边解码，逐条产出笔记，
+# 不把整本书的笔记、章节和书籍信息一次性载入内存
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+def iter_object_stream(chunks, stream_key, on_value=None, keys=None):
+    """增量解析顶层JSON对象，逐个产出 stream_key 数组中的元素
+
+    其余顶层字段解码后交给 on_value(key, value)，未提供时直接丢弃。
+    传入 keys 集合时，记录解析到的全部顶层字段名。
+    chunks 为已解码的文本片段迭代器。
+    """
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def fill():
+        nonlocal buf, pos, exhausted
+        for chunk in chunks:
+            if chunk:
+                # 丢弃已消费部分，缓冲区只保留尚未解析的数据
+                buf = buf[pos:] + chunk
+                pos = 0
+                return True
+        exhausted = True
+        return False
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                raise ValueError("JSON数据不完整")
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"JSON格式错误: 期望 '{char}'，实际为 '{buf[pos]}'")
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+                # 数字可能被截断在缓冲区末尾（如 "3." 只解析出 3），需读到后续数据才能确认完整
+                tail = end
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    while tail < len(buf) and buf[tail] in _NUMBER_CHARS:
+                        tail += 1
+                if tail < len(buf) or exhausted:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            fill()
+
+    expect("{")
+    if peek() == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        if keys is not None:
+            keys.add(key)
+        if key == stream_key:
+            expect("[")
+            if peek() == "]":
+                pos += 1
+            else:
+                while True:
+                    yield decode()
+                    if peek() == "]":
+                        pos += 1
+                        break
+                    expect(",")
+        else:
+            value = decode()
+            if on_value:
+                on_value(key, value)
+        if peek() == "}":
+            return
+        expect(",")
+
+def iter_text(response, chunk_size=CHUNK_SIZE):
+    """按块读取响应并增量解码为UTF-8文本"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+def iter_bookmarks(response, chapters=None, result=None):
+    """逐条产出笔记（"updated" 数组），章节标题收集到 chapters 字典 {chapterUid: 标题}
+
+    响应需以 stream=True 请求。微信读书通常在笔记之后才返回章节列表，
+    因此章节标题要等全部笔记产出后才完整。
+    传入 result 字典时，解析结束后记录 keys（顶层字段名集合）以及
+    errcode / errmsg（登录超时等错误仍返回 HTTP 200，需据此判断）。
+    """
+    keys = set()
+
+    def on_value(key, value):
+        if key == "chapters" and chapters is not None:
+            for chapter in value:
+                chapters[chapter.get("chapterUid")] = chapter.get("title", "")
+        elif key in ("errcode", "errmsg") and result is not None:
+            result[key] = value
+
+    if result is not None:
+        result["keys"] = keys
+    yield from iter_object_stream(iter_text(response), "updated", on_value, keys)
+
+def is_complete(result):
+    """响应是否为完整、无错误的笔记列表：出现了 "updated" 字段且没有非零 errcode"""
+    return "updated" in result.get("keys", ()) and not result.get("errcode")